@@ -1,9 +1,35 @@
-def get_context_for_agent(jupyter_lab_url: str, jupyter_lab_extension: str):
+def get_context_for_agent(
+    jupyter_lab_url: str,
+    jupyter_lab_extension: str,
+    preloaded_tables: dict = None,
+    output_governor: bool = False,
+    categorical_columns: dict = None,
+):
     task_context = """context for you to act in the chrome-browser: I've load chinook database exports previously into this folder where the notebook is. The current link to notebook instance contains following files:
     album_sample.csv       eda_notebook.ipynb (this notebook)   invoiceline_sample.csv
     artist_sample.csv      genre_sample.csv       mediatype_sample.csv
     customer_sample.csv    invoice_sample.csv     track_sample.csv
     """
+    if preloaded_tables:
+        table_lines = "\n".join(
+            f"    {var_name} - {file_name}" for var_name, file_name in preloaded_tables.items()
+        )
+        task_context += f"""
+    The notebook kernel has already imported pandas as pd, numpy as np and matplotlib.pyplot as plt, and loaded every csv into a DataFrame, use these variables directly instead of reading the files again:
+{table_lines}
+    """
+    if categorical_columns:
+        category_lines = "\n".join(
+            f"    {var_name}: {', '.join(columns)}" for var_name, columns in categorical_columns.items()
+        )
+        task_context += f"""
+    These columns are categoricals: pass observed=True to groupby() on them and drop zero counts from value_counts(), otherwise absent categories show up as empty rows:
+{category_lines}
+    """
+    if output_governor:
+        task_context += """
+    Long cell outputs are truncated and large plots are downscaled by the kernel, print summaries (head(), describe(), aggregations) instead of whole tables.
+    """
 
     jlab_controls = """
     COMMAND MODE commands:
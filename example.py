@@ -2,26 +2,55 @@
 Simple try of the agent.
 
 @dev You need to add AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT to your environment variables.
+
+langchain_openai and browser_use are imported lazily during startup, while
+jupyter-lab starts up; --startup-profile reports how long each of these phases
+took.
 """
 
+import time
+
+_MODULE_IMPORT_STARTED = time.perf_counter()
+
 import os
 import sys
 import logging
 import argparse
-import time
 import asyncio
+import importlib
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from langchain_openai import AzureChatOpenAI
-from browser_use import Agent, Controller
-from whisper_request_utils import get_latest_user_request
+from whisper_request_utils import (
+    get_latest_user_request,
+    push_task_result,
+    REQUEST_TYPE_CANCEL,
+    REQUEST_TYPE_TASK,
+)
 from context_utils import get_context_for_agent
-from jupyter_loader import jupyter_lab_server
+from jupyter_loader import (
+    jupyter_lab_server,
+    interrupt_busy_kernels,
+    wait_for_jupyter_lab,
+    CHINOOK_EXPORTS_DIR,
+)
+from kernel_warmup import table_variable_names, categorical_columns
+from notebook_results import latest_figures, max_execution_count
+
+if TYPE_CHECKING:
+    from browser_use import Agent
+
+_MODULE_IMPORT_FINISHED = time.perf_counter()
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
+logger = logging.getLogger(__name__)
+
+
 # Set up argument parsing
-def setup_args():
+def setup_args(argv=None):
     parser = argparse.ArgumentParser(
         description="Browser automation agent for data analysis"
     )
@@ -35,7 +64,28 @@ def setup_args():
         action="store_true",
         help="Enable telegram whisper (default: False)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--task_timeout",
+        type=float,
+        default=600,
+        help="Seconds after which a running task is stopped (default: 600)",
+    )
+    parser.add_argument(
+        "--no_kernel_warmup",
+        action="store_true",
+        help="Don't preload pandas and the chinook tables in the notebook kernel",
+    )
+    parser.add_argument(
+        "--no_output_governor",
+        action="store_true",
+        help="Don't truncate large cell outputs in the notebook kernel",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Report import and startup phase timings once startup is done",
+    )
+    return parser.parse_args(argv)
 
 
 # Set up logging
@@ -49,76 +99,234 @@ def setup_logging(debug=False):
     return logging.getLogger(__name__)
 
 
-# Parse arguments and setup logging
-args = setup_args()
-logger = setup_logging(args.debug)
+class StartupProfile:
+    """Wall-clock timings of the startup phases, phases may overlap"""
+
+    def __init__(self):
+        self.started = _MODULE_IMPORT_STARTED
+        self.timings = [
+            ("import entry point modules", 0.0, _MODULE_IMPORT_FINISHED - self.started)
+        ]
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append(
+                (name, start - self.started, time.perf_counter() - start)
+            )
+
+    def report(self):
+        lines = [
+            f"  {name:<28} started at {offset:6.2f}s, took {duration:6.2f}s"
+            for name, offset, duration in sorted(self.timings, key=lambda t: t[1])
+        ]
+        total = time.perf_counter() - self.started
+        logger.info(
+            "Startup profile:\n" + "\n".join(lines) + f"\n  total {total:.2f}s"
+        )
+
+
+def import_agent_stack(profile: StartupProfile):
+    """Import the heavy dependencies one after the other in a single thread:
+    they share langchain_core, openai and pydantic, and importing them from
+    two threads at once can hand one of them a partially initialised module"""
+    for module in ("browser_use", "langchain_openai"):
+        with profile.phase(f"import {module}"):
+            importlib.import_module(module)
+
+
+def create_llm(profile: StartupProfile):
+    from langchain_openai import AzureChatOpenAI
 
-controller = Controller()
+    with profile.phase("create llm client"):
+        # Initialize the Azure OpenAI client
+        model_name = "gpt-4.1"
+        deployment = "gpt-4.1"
 
-# Retrieve Azure-specific environment variables
-load_dotenv()
-azure_openai_api_key = os.environ.get("AZURE_OPENAI_API_KEY")
-azure_openai_endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
+        llm = AzureChatOpenAI(
+            model_name=model_name,
+            openai_api_key=os.environ.get("AZURE_OPENAI_API_KEY"),
+            azure_endpoint=os.environ.get("AZURE_OPENAI_ENDPOINT"),
+            deployment_name=deployment,
+            api_version="2024-12-01-preview",
+        )
+    return llm
 
-logger.info("Starting browser automation agent")
-logger.debug(f"Azure endpoint configured: {azure_openai_endpoint is not None}")
 
+async def launch_browser(profile: StartupProfile):
+    from browser_use import BrowserSession
 
-async def browser_use_query_and_get_history(agent: Agent):
+    with profile.phase("launch browser"):
+        # keep_alive lets the session outlive each agent, every task reuses it
+        browser_session = BrowserSession(keep_alive=True)
+        await browser_session.start()
+    return browser_session
+
+
+async def prepare_agent_stack(profile: StartupProfile):
+    await asyncio.to_thread(import_agent_stack, profile)
+    llm = create_llm(profile)
+    browser_session = await launch_browser(profile)
+    return llm, browser_session
+
+
+async def start_jupyter_lab(url: str, profile: StartupProfile):
+    with profile.phase("start jupyter-lab"):
+        if not await asyncio.to_thread(wait_for_jupyter_lab, url):
+            logger.warning(f"Jupyter-lab at {url} didn't answer in time")
+
+
+async def browser_use_query_and_get_history(agent: "Agent"):
     logger.debug("Starting agent execution with max_steps=1000")
     history = await agent.run(max_steps=1000)
     logger.info("Agent execution completed successfully")
     return history
 
 
-def get_agent(task: str):
-    logger.debug("Initializing Azure OpenAI client and agent")
-    # Initialize the Azure OpenAI client
-    model_name = "gpt-4.1"
-    deployment = "gpt-4.1"
-
-    llm = AzureChatOpenAI(
-        model_name=model_name,
-        openai_api_key=azure_openai_api_key,
-        azure_endpoint=azure_openai_endpoint,
-        deployment_name=deployment,
-        api_version="2024-12-01-preview",
+async def run_agent_task(
+    agent: "Agent", jupyter_lab_url: str, timeout: float, request_waiter=None
+):
+    """Run the agent until it finishes, its deadline passes or request_waiter
+    yields a newer request. Returns None if the agent finished, otherwise the
+    reason it was stopped."""
+    agent_task = asyncio.create_task(browser_use_query_and_get_history(agent))
+    watched = {agent_task} if request_waiter is None else {agent_task, request_waiter}
+    done, _ = await asyncio.wait(
+        watched, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
     )
+    if agent_task in done:
+        agent_task.result()
+        return None
+
+    if request_waiter in done:
+        if request_waiter.result()["type"] == REQUEST_TYPE_CANCEL:
+            reason = "cancelled by the user"
+        else:
+            reason = "superseded by a newer request"
+    else:
+        reason = f"timed out after {timeout} seconds"
+    logger.warning(f"Stopping agent task, it was {reason}")
+
+    # stop the browser agent first so it doesn't queue new cells, then
+    # interrupt whatever cell it left running in the kernel
+    agent.stop()
+    agent_task.cancel()
+    await asyncio.gather(agent_task, return_exceptions=True)
+    interrupted = await asyncio.to_thread(interrupt_busy_kernels, jupyter_lab_url)
+    if interrupted:
+        logger.info(f"Interrupted busy kernels: {interrupted}")
+    return reason
+
+
+def get_agent(task: str, llm, browser_session, controller):
+    from browser_use import Agent
+
+    logger.debug("Initializing agent")
     agent = Agent(
         task=task,
         llm=llm,
         controller=controller,
+        browser_session=browser_session,
         max_failures=3,
     )
     logger.debug("Agent initialized successfully")
     return agent
 
 
-def get_next_user_request(args, processed_requests: set):
+async def read_console_input(prompt: str) -> str:
+    """input() that doesn't block the event loop; a daemon thread is used so a
+    pending prompt never holds up interpreter shutdown"""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            loop.call_soon_threadsafe(settle, future.set_result, input(prompt))
+        except EOFError as e:
+            loop.call_soon_threadsafe(settle, future.set_exception, e)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+async def get_next_user_request(args, processed_requests: set):
+    """Wait for the next request, returns a dict with "text" and "type" keys"""
     if args.telegram_whisper:
+        # this keeps polling while a task runs, so only report state changes
+        print("waiting for user's request from telegram bot...")
+        failing = False
         while True:
-            print("waiting for user's request from telegram bot...")
-            latest_request = get_latest_user_request()
+            latest_request = await asyncio.to_thread(get_latest_user_request)
             # Add error handling for None response
             if latest_request is None:
-                print(
-                    "Failed to get request from telegram bot, retrying in 5 seconds..."
-                )
-                time.sleep(5)
+                if not failing:
+                    print(
+                        "Failed to get request from telegram bot, retrying every 5 seconds..."
+                    )
+                failing = True
+                await asyncio.sleep(5)
                 continue
+            failing = False
             if latest_request["id"] not in processed_requests:
                 processed_requests.add(latest_request["id"])
-                return latest_request["text"]
-            time.sleep(1)
+                # an empty task must never preempt the running one
+                if (
+                    latest_request["type"] == REQUEST_TYPE_CANCEL
+                    or latest_request["text"].strip()
+                ):
+                    return latest_request
+            await asyncio.sleep(1)
     else:
-        return input("Enter your request: ")
+        while True:
+            text = await read_console_input(
+                "Enter your request (or /cancel to stop the running one): "
+            )
+            if text.strip() == "/cancel":
+                return {"text": "", "type": REQUEST_TYPE_CANCEL}
+            if text.strip():
+                return {"text": text, "type": REQUEST_TYPE_TASK}
+
+
+async def report_task_result(
+    request: dict, agent: "Agent", reason, notebook_path: str, since_execution_count: int
+):
+    """Send the final answer and the figures the task produced back to the user"""
+    history = agent.state.history
+    if reason is not None:
+        text = f"Your request was {reason}."
+    elif not history.is_done():
+        # run() also returns after max_failures or the step cap, the last
+        # result is then just the output of some intermediate action
+        text = "Your request couldn't be completed, the agent gave up before finishing it."
+    elif not history.is_successful():
+        text = "The agent finished but couldn't fulfil your request."
+        if history.final_result():
+            text += "\n\n" + history.final_result()
+    else:
+        text = history.final_result() or "Your request is done."
+    images = await asyncio.to_thread(
+        latest_figures, notebook_path, since_execution_count
+    )
+    logger.info(f"Reporting result of request {request['id']} with {len(images)} figures")
+    await asyncio.to_thread(push_task_result, request["id"], text, images)
 
 
 async def perform_tasks_in_jupyter_lab(
     args,
+    llm,
+    browser_session,
     jupyter_lab_url: str = "",
     jupyter_lab_extension: str = "/lab/workspaces/auto-Z/tree/eda_notebook.ipynb",
 ):
+    from browser_use import Controller
+
     logger.info(
         f"Starting browser automation task in jupyter-lab instance at {jupyter_lab_url}"
     )
@@ -132,31 +340,111 @@ async def perform_tasks_in_jupyter_lab(
         else:
             logger.warning("Could not get initial request from telegram bot")
 
-    task_preprompt = get_context_for_agent(jupyter_lab_url, jupyter_lab_extension)
+    preloaded_tables = tables_categoricals = None
+    if not args.no_kernel_warmup:
+        preloaded_tables = table_variable_names(CHINOOK_EXPORTS_DIR)
+        tables_categoricals = await asyncio.to_thread(
+            categorical_columns, CHINOOK_EXPORTS_DIR
+        )
+    task_preprompt = get_context_for_agent(
+        jupyter_lab_url,
+        jupyter_lab_extension,
+        preloaded_tables,
+        output_governor=not args.no_output_governor,
+        categorical_columns=tables_categoricals,
+    )
+
+    notebook_path = os.path.join(
+        CHINOOK_EXPORTS_DIR, os.path.basename(jupyter_lab_extension)
+    )
+
+    controller = Controller()
 
     # Initial task to open the notebook page
     initial_task = task_preprompt + "\n\nOpen the notebook page."
-    agent = get_agent(initial_task)
-    await browser_use_query_and_get_history(agent)
+    agent = get_agent(initial_task, llm, browser_session, controller)
+    await run_agent_task(agent, jupyter_lab_url, args.task_timeout)
     print("task_preprompt: ", task_preprompt)
 
+    # the waiter keeps listening for requests while a task runs, so a newer
+    # request or a cancel message can preempt it
+    request_waiter = None
     while True:
-        current_task = get_next_user_request(args, processed_requests)
-        # Create a new agent for each user task
-        full_task = task_preprompt + "\n\n" + current_task
-        agent = get_agent(full_task)
-        await browser_use_query_and_get_history(agent)
-
+        if request_waiter is None:
+            request_waiter = asyncio.create_task(
+                get_next_user_request(args, processed_requests)
+            )
+        current_request = await request_waiter
+        request_waiter = None
+        if current_request["type"] == REQUEST_TYPE_CANCEL:
+            logger.info("No running task to cancel")
+            continue
 
-if __name__ == "__main__":
-    logger.info("Script execution started")
+        # Create a new agent for each user task
+        full_task = task_preprompt + "\n\n" + current_request["text"]
+        agent = get_agent(full_task, llm, browser_session, controller)
+        request_waiter = asyncio.create_task(
+            get_next_user_request(args, processed_requests)
+        )
+        since_execution_count = max_execution_count(notebook_path)
+        reason = await run_agent_task(
+            agent, jupyter_lab_url, args.task_timeout, request_waiter
+        )
+        if args.telegram_whisper:
+            await report_task_result(
+                current_request, agent, reason, notebook_path, since_execution_count
+            )
+        # the cancel message has done its job once the task is stopped
+        if (
+            request_waiter.done()
+            and request_waiter.result()["type"] == REQUEST_TYPE_CANCEL
+        ):
+            request_waiter = None
 
-    logger.debug("Executing main task")
-    args = setup_args()
 
+async def run(args, profile: StartupProfile):
     # context manager for automatic cleanup of the jupyter-lab instance
-    with jupyter_lab_server() as url:
+    with jupyter_lab_server(
+        warmup=not args.no_kernel_warmup,
+        output_governor=not args.no_output_governor,
+        wait=False,
+    ) as url:
         print("url: ", url)
-        asyncio.run(perform_tasks_in_jupyter_lab(args, jupyter_lab_url=url))
+        # the imports and the browser launch overlap with the jupyter-lab
+        # startup, only the first agent run needs both
+        _, (llm, browser_session) = await asyncio.gather(
+            start_jupyter_lab(url, profile),
+            prepare_agent_stack(profile),
+        )
+        if args.startup_profile:
+            profile.report()
 
+        try:
+            await perform_tasks_in_jupyter_lab(
+                args, llm, browser_session, jupyter_lab_url=url
+            )
+        finally:
+            # stop() is a no-op for keep_alive sessions, the browser has to go
+            # with the process so a restart doesn't leave chrome running
+            browser_session.browser_profile.keep_alive = False
+            await browser_session.stop()
+
+
+def main(argv=None):
+    profile = StartupProfile()
+    args = setup_args(argv)
+    setup_logging(args.debug)
+
+    # Retrieve Azure-specific environment variables
+    load_dotenv()
+    logger.info("Starting browser automation agent")
+    logger.debug(
+        f"Azure endpoint configured: {os.environ.get('AZURE_OPENAI_ENDPOINT') is not None}"
+    )
+
+    asyncio.run(run(args, profile))
     print("Jupyter-lab has been automatically stopped.")
+
+
+if __name__ == "__main__":
+    main()
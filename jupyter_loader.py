@@ -3,12 +3,45 @@ import time
 import subprocess
 from contextlib import contextmanager
 
+import requests
+
+CURR_FILE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHINOOK_EXPORTS_DIR = os.path.join(CURR_FILE_DIR, "chinook_exports")
+KERNEL_WARMUP_SCRIPT = os.path.join(CURR_FILE_DIR, "kernel_warmup.py")
+
+
+def wait_for_jupyter_lab(url, timeout=30, interval=0.2):
+    """Poll the jupyter-lab instance at url until it answers, returns whether it did"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            # any answer will do, the status endpoint may require auth
+            requests.get(f"{url}/api/status", timeout=1)
+            return True
+        except requests.RequestException:
+            time.sleep(interval)
+    return False
+
 
 @contextmanager
-def jupyter_lab_server(port=8889):
-    """Context manager that starts jupyter-lab and automatically stops it"""
-    curr_file_dir = os.path.dirname(os.path.abspath(__file__))
-    chinook_db_folder = os.path.join(curr_file_dir, "chinook_exports")
+def jupyter_lab_server(port=8889, warmup=True, output_governor=True, wait=True):
+    """Context manager that starts jupyter-lab and automatically stops it
+
+    With warmup the notebook kernels run kernel_warmup.py on start, which
+    preloads the analysis stack and the chinook tables as `<table>_df` globals.
+    With output_governor the same startup script bounds the size of cell outputs.
+    Without wait the url is yielded right away and the caller is expected to
+    call wait_for_jupyter_lab itself, e.g. while other startup work runs.
+    """
+    chinook_db_folder = CHINOOK_EXPORTS_DIR
+
+    # kernels inherit the environment of the jupyter-lab process
+    env = os.environ.copy()
+    if warmup or output_governor:
+        env["PYTHONSTARTUP"] = KERNEL_WARMUP_SCRIPT
+        env["CHINOOK_EXPORTS_DIR"] = chinook_db_folder
+        env["KERNEL_WARMUP_TABLES"] = "1" if warmup else "0"
+        env["KERNEL_OUTPUT_GOVERNOR"] = "1" if output_governor else "0"
 
     jupyter_command = [
         "jupyter-lab",
@@ -25,15 +58,16 @@ def jupyter_lab_server(port=8889):
         process = subprocess.Popen(
             jupyter_command,
             cwd=chinook_db_folder,
+            env=env,
             stdout=subprocess.DEVNULL,
             stderr=subprocess.DEVNULL,
         )
 
-        # Give it time to start
-        time.sleep(5)
-
         url = f"http://127.0.0.1:{port}"
-        print(f"Jupyter-lab started (PID: {process.pid}) at {url}")
+        if wait:
+            if not wait_for_jupyter_lab(url):
+                print("Jupyter-lab didn't answer in time, continuing anyway")
+            print(f"Jupyter-lab started (PID: {process.pid}) at {url}")
 
         yield url
 
@@ -49,3 +83,28 @@ def jupyter_lab_server(port=8889):
                 print("Force killing jupyter-lab process")
                 process.kill()
                 process.wait()
+
+
+def interrupt_busy_kernels(url):
+    """Interrupt every busy kernel of the jupyter-lab instance at url, returns their ids"""
+    interrupted = []
+    try:
+        with requests.Session() as session:
+            # visiting the lab page sets the _xsrf cookie required for POST requests
+            session.get(f"{url}/lab", timeout=5)
+            headers = {"X-XSRFToken": session.cookies.get("_xsrf", "")}
+
+            response = session.get(f"{url}/api/kernels", timeout=5)
+            response.raise_for_status()
+            for kernel in response.json():
+                if kernel.get("execution_state") != "busy":
+                    continue
+                session.post(
+                    f"{url}/api/kernels/{kernel['id']}/interrupt",
+                    headers=headers,
+                    timeout=5,
+                ).raise_for_status()
+                interrupted.append(kernel["id"])
+    except requests.RequestException as e:
+        print(f"Failed to interrupt jupyter-lab kernels: {e}")
+    return interrupted
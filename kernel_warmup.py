@@ -0,0 +1,110 @@
+"""
+Kernel warm-up profile for the analysis notebook.
+
+jupyter_lab_server passes this file to the notebook kernel as PYTHONSTARTUP, so
+the analysis stack is imported and every exported chinook table is loaded once,
+before the agent writes its first cell. The tables become `<table>_df` globals,
+e.g. `album_sample.csv` -> `album_df`. The same script installs the output
+governor (see output_governor.py) that keeps cell outputs small.
+
+Both steps are switched on and off by jupyter_lab_server through the
+KERNEL_WARMUP_TABLES and KERNEL_OUTPUT_GOVERNOR environment variables.
+"""
+
+import os
+
+TABLE_FILE_SUFFIX = "_sample.csv"
+# string columns become categoricals only when they have at most
+# CATEGORY_MAX_UNIQUE distinct values and each value repeats on average at
+# least 1 / CATEGORY_MAX_UNIQUE_RATIO times, which keeps sparse free text
+# like Company or Fax out
+CATEGORY_MAX_UNIQUE = 30
+CATEGORY_MAX_UNIQUE_RATIO = 0.25
+
+
+def table_variable_names(exports_dir):
+    """Map each exported csv in exports_dir to the variable it's loaded into"""
+    return {
+        file_name[: -len(TABLE_FILE_SUFFIX)] + "_df": file_name
+        for file_name in sorted(os.listdir(exports_dir))
+        if file_name.endswith(TABLE_FILE_SUFFIX)
+    }
+
+
+def compact_dtypes(df):
+    """Downcast integer columns and turn repetitive string columns into categoricals"""
+    import numpy as np
+    import pandas as pd
+
+    int32 = np.iinfo(np.int32)
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_integer_dtype(series):
+            # no narrower than int32, int8/int16 ids overflow silently in arithmetic
+            if series.dtype.itemsize > 4 and int32.min <= series.min() and series.max() <= int32.max:
+                df[col] = series.astype(np.int32)
+        elif pd.api.types.is_string_dtype(series):
+            unique = series.nunique()
+            if unique <= CATEGORY_MAX_UNIQUE and unique <= CATEGORY_MAX_UNIQUE_RATIO * series.count():
+                df[col] = series.astype("category")
+    return df
+
+
+def load_chinook_tables(exports_dir):
+    """Load every exported table into a dict of DataFrames keyed by variable name"""
+    import pandas as pd
+
+    return {
+        var_name: compact_dtypes(pd.read_csv(os.path.join(exports_dir, file_name)))
+        for var_name, file_name in table_variable_names(exports_dir).items()
+    }
+
+
+def categorical_columns(exports_dir):
+    """Map each table variable to its columns that load as categoricals"""
+    return {
+        var_name: columns
+        for var_name, df in load_chinook_tables(exports_dir).items()
+        if (columns := list(df.select_dtypes("category").columns))
+    }
+
+
+def warm_up_kernel(namespace):
+    """Fill the notebook namespace as requested by the KERNEL_* environment variables"""
+    if os.environ.get("KERNEL_WARMUP_TABLES", "1") == "1":
+        import numpy as np
+        import pandas as pd
+        import matplotlib.pyplot as plt
+
+        namespace.update(np=np, pd=pd, plt=plt)
+        namespace.update(
+            load_chinook_tables(os.environ.get("CHINOOK_EXPORTS_DIR", os.getcwd()))
+        )
+
+    if os.environ.get("KERNEL_OUTPUT_GOVERNOR", "1") == "1":
+        from output_governor import install_output_governor
+
+        namespace["output_governor"] = install_output_governor()
+
+
+# everything this script defines, none of it belongs in the notebook namespace
+_SCRIPT_NAMES = (
+    "os",
+    "TABLE_FILE_SUFFIX",
+    "CATEGORY_MAX_UNIQUE",
+    "CATEGORY_MAX_UNIQUE_RATIO",
+    "table_variable_names",
+    "compact_dtypes",
+    "load_chinook_tables",
+    "categorical_columns",
+    "warm_up_kernel",
+    "_SCRIPT_NAMES",
+)
+
+
+if __name__ == "__main__":
+    # executed by the kernel as PYTHONSTARTUP, globals() is the notebook namespace
+    warm_up_kernel(globals())
+    for _name in _SCRIPT_NAMES:
+        globals().pop(_name, None)
+    del _name
@@ -0,0 +1,76 @@
+import io
+import json
+import base64
+
+# Telegram downsizes photos to 1280px anyway, no point in sending more
+MAX_IMAGE_PIXELS = 1280
+MAX_IMAGES = 10
+
+
+def _code_cells(notebook_path):
+    with open(notebook_path, encoding="utf-8") as f:
+        notebook = json.load(f)
+    return [cell for cell in notebook.get("cells", []) if cell.get("cell_type") == "code"]
+
+
+def _execution_count(cell):
+    return cell.get("execution_count") or 0
+
+
+def max_execution_count(notebook_path):
+    """Highest execution count saved in the notebook, 0 if nothing ran yet"""
+    try:
+        cells = _code_cells(notebook_path)
+    except (OSError, ValueError):
+        return 0
+    return max(map(_execution_count, cells), default=0)
+
+
+def downscale_png(png_bytes, max_pixels=MAX_IMAGE_PIXELS):
+    """Shrink the image to fit max_pixels on its longest side"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(png_bytes))
+    # decode now so truncated data fails here rather than at the receiver
+    image.load()
+    if max(image.size) <= max_pixels:
+        return png_bytes
+    image.thumbnail((max_pixels, max_pixels))
+    output = io.BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+def latest_figures(notebook_path, since_execution_count=0, limit=MAX_IMAGES):
+    """Downscaled png outputs of the cells executed after since_execution_count,
+    most recently executed first"""
+    try:
+        cells = _code_cells(notebook_path)
+    except (OSError, ValueError) as e:
+        print(f"Failed to read figures from {notebook_path}: {e}")
+        return []
+
+    # the kernel was restarted, every saved output is newer than the snapshot
+    if since_execution_count > max(map(_execution_count, cells), default=0):
+        since_execution_count = 0
+    executed = [cell for cell in cells if _execution_count(cell) > since_execution_count]
+    executed.sort(key=_execution_count, reverse=True)
+
+    figures = []
+    for cell in executed:
+        for output in cell.get("outputs", []):
+            png = output.get("data", {}).get("image/png")
+            if png is None:
+                continue
+            if isinstance(png, list):
+                png = "".join(png)
+            try:
+                figures.append(downscale_png(base64.b64decode(png)))
+            except (ValueError, OSError) as e:
+                # binascii.Error and PIL.UnidentifiedImageError, a broken output
+                # shouldn't cost the user the other figures
+                print(f"Skipping unreadable figure of cell {cell['execution_count']}: {e}")
+                continue
+            if len(figures) == limit:
+                return figures
+    return figures
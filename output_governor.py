@@ -0,0 +1,174 @@
+"""
+Kernel-side output policy for the analysis notebook.
+
+Long agent sessions print whole DataFrames and dense plots, which bloats
+eda_notebook.ipynb, slows down the jupyter-lab page and the agent's next
+observation. The governor keeps every cell's output bounded:
+
+- pandas tables render at most MAX_TABLE_ROWS x MAX_TABLE_COLUMNS
+- stdout/stderr and text/plain results are cut at MAX_TEXT_CHARS per cell
+- oversized text/html results are dropped in favour of the text/plain repr
+- matplotlib figures render at most MAX_FIGURE_PIXELS on their longest side
+
+Everything that was cut is recorded in OutputGovernor.elided and announced
+with a short note in the cell output.
+"""
+
+import sys
+
+MAX_TEXT_CHARS = 5000
+MAX_HTML_CHARS = 50000
+MAX_TABLE_ROWS = 20
+MAX_TABLE_COLUMNS = 20
+MAX_COLUMN_WIDTH = 50
+MAX_SEQ_LENGTH = 100
+MAX_FIGURE_PIXELS = 1000
+
+
+class _CappedStream:
+    """Wraps a kernel output stream and drops whatever exceeds the cell budget"""
+
+    def __init__(self, stream, name, max_chars):
+        self._stream = stream
+        self._name = name
+        self._max_chars = max_chars
+        self.reset()
+
+    def reset(self):
+        self.written = 0
+        self.elided = 0
+
+    def write(self, text):
+        length = len(text)
+        remaining = max(self._max_chars - self.written, 0)
+        if length > remaining:
+            self.elided += length - remaining
+            text = text[:remaining]
+        self.written += len(text)
+        if text:
+            self._stream.write(text)
+        # report the full length so callers don't retry the elided part
+        return length
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class OutputGovernor:
+    def __init__(
+        self,
+        shell,
+        max_text_chars=MAX_TEXT_CHARS,
+        max_html_chars=MAX_HTML_CHARS,
+        max_figure_pixels=MAX_FIGURE_PIXELS,
+    ):
+        self.shell = shell
+        self.max_text_chars = max_text_chars
+        self.max_html_chars = max_html_chars
+        self.max_figure_pixels = max_figure_pixels
+        # one record per elided output: execution count, output kind and sizes
+        self.elided = []
+        self._execution_count = shell.execution_count
+        self._streams = []
+        self._format = None
+
+    def install(self):
+        self._configure_pandas()
+        self.shell.display_formatter.formatters[
+            "text/plain"
+        ].max_seq_length = MAX_SEQ_LENGTH
+
+        self._format = self.shell.display_formatter.format
+        self.shell.display_formatter.format = self.format
+
+        sys.stdout = _CappedStream(sys.stdout, "stdout", self.max_text_chars)
+        sys.stderr = _CappedStream(sys.stderr, "stderr", self.max_text_chars)
+        self._streams = [sys.stdout, sys.stderr]
+
+        self.shell.events.register("pre_run_cell", self.pre_run_cell)
+        self.shell.events.register("post_run_cell", self.post_run_cell)
+        return self
+
+    def _configure_pandas(self):
+        try:
+            import pandas as pd
+        except ImportError:
+            return
+        pd.set_option("display.max_rows", MAX_TABLE_ROWS)
+        pd.set_option("display.min_rows", MAX_TABLE_ROWS)
+        pd.set_option("display.max_columns", MAX_TABLE_COLUMNS)
+        pd.set_option("display.max_colwidth", MAX_COLUMN_WIDTH)
+
+    def _record(self, output, original_size, kept_size):
+        self.elided.append(
+            {
+                "execution_count": self._execution_count,
+                "output": output,
+                "original_size": original_size,
+                "kept_size": kept_size,
+            }
+        )
+
+    def pre_run_cell(self, info):
+        self._execution_count = self.shell.execution_count
+        for stream in self._streams:
+            stream.reset()
+
+    def post_run_cell(self, result):
+        for stream in self._streams:
+            if stream.elided:
+                self._record(stream._name, stream.written + stream.elided, stream.written)
+                stream._stream.write(
+                    f"\n... [output governor: {stream.elided} characters of "
+                    f"{stream._name} elided]\n"
+                )
+
+    def _bounded_figure_dpi(self, obj):
+        # only matplotlib figures need bounding and they exist only once it's imported
+        figure_module = sys.modules.get("matplotlib.figure")
+        if figure_module is None or not isinstance(obj, figure_module.Figure):
+            return None
+        dpi = obj.get_dpi()
+        max_dpi = self.max_figure_pixels / max(obj.get_size_inches())
+        if dpi <= max_dpi:
+            return None
+        self._record("image", int(dpi * max(obj.get_size_inches())), self.max_figure_pixels)
+        return max_dpi
+
+    def format(self, obj, include=None, exclude=None):
+        bounded_dpi = self._bounded_figure_dpi(obj)
+        if bounded_dpi is None:
+            data, metadata = self._format(obj, include=include, exclude=exclude)
+        else:
+            dpi = obj.get_dpi()
+            obj.set_dpi(bounded_dpi)
+            try:
+                data, metadata = self._format(obj, include=include, exclude=exclude)
+            finally:
+                obj.set_dpi(dpi)
+
+        text = data.get("text/plain")
+        if text is not None and len(text) > self.max_text_chars:
+            self._record("text/plain", len(text), self.max_text_chars)
+            data["text/plain"] = (
+                text[: self.max_text_chars]
+                + f"\n... [output governor: {len(text) - self.max_text_chars} characters elided]"
+            )
+        html = data.get("text/html")
+        if html is not None and len(html) > self.max_html_chars and text is not None:
+            self._record("text/html", len(html), 0)
+            del data["text/html"]
+        return data, metadata
+
+
+def install_output_governor(shell=None, **limits):
+    """Install the output policy into the running IPython kernel and return it"""
+    if shell is None:
+        from IPython import get_ipython
+
+        shell = get_ipython()
+    return OutputGovernor(shell, **limits).install()
@@ -0,0 +1,99 @@
+import os
+import re
+import time
+import hashlib
+from collections import OrderedDict
+
+# keep at most this much audio on disk and nothing older than MAX_AGE_S
+MAX_BYTES = int(os.getenv("AUDIO_MAX_BYTES", 512 * 1024 * 1024))
+MAX_AGE_S = int(os.getenv("AUDIO_MAX_AGE_S", 24 * 60 * 60))
+
+
+class AudioStore:
+    """mp3 files stored under the sha256 of their content, with size/age based retention
+
+    The index maps a file name to its (size, mtime) and is ordered oldest first,
+    so listing never touches the disk and eviction pops from the front.
+    """
+
+    def __init__(self, root, max_bytes=MAX_BYTES, max_age_s=MAX_AGE_S, extension="mp3"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.extension = extension
+        self.index = OrderedDict()
+        self.total_bytes = 0
+
+        os.makedirs(root, exist_ok=True)
+        # only files stored by a previous run are indexed, anything else in
+        # the directory wasn't put there through the store and isn't served
+        stored_name = re.compile(rf"[0-9a-f]{{64}}\.{re.escape(extension)}")
+        entries = []
+        for name in os.listdir(root):
+            if stored_name.fullmatch(name):
+                stat = os.stat(os.path.join(root, name))
+                entries.append((stat.st_mtime, name, stat.st_size))
+        for mtime, name, size in sorted(entries):
+            self.index[name] = (size, mtime)
+            self.total_bytes += size
+        self.evict()
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def get(self, name):
+        """(path, size, mtime) of a stored file or None"""
+        # the age limit applies even when nothing new is uploaded
+        self.evict()
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        if not os.path.exists(self.path(name)):
+            # removed outside the store
+            self._forget(name)
+            return None
+        return (self.path(name), *entry)
+
+    def put(self, data):
+        """Store data and return its name, storing the same content again only refreshes its age"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{self.extension}"
+        now = time.time()
+        if name in self.index and os.path.exists(self.path(name)):
+            # refresh the age of content uploaded again
+            os.utime(self.path(name), (now, now))
+            self.index.move_to_end(name)
+        else:
+            # also rewrites indexed content whose file was removed outside the store
+            self._forget(name)
+            tmp_path = self.path(f".{name}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path(name))
+            self.total_bytes += len(data)
+        self.index[name] = (len(data), now)
+        self.evict(keep=name)
+        return name
+
+    def names(self):
+        self.evict()
+        return list(self.index)
+
+    def _forget(self, name):
+        entry = self.index.pop(name, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+
+    def evict(self, keep=None):
+        """Drop the oldest files until the store is within its age and size limits"""
+        now = time.time()
+        for name, (size, mtime) in list(self.index.items()):
+            if name == keep:
+                continue
+            too_old = now - mtime > self.max_age_s
+            if not too_old and self.total_bytes <= self.max_bytes:
+                break
+            self._forget(name)
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
@@ -1,25 +1,82 @@
-from quart import Quart, request, send_from_directory, jsonify
+from quart import Quart, Response, request, jsonify
+from werkzeug.http import http_date
 import os
 
+from audio_store import AudioStore
+
 app = Quart(__name__)
 
 # whisper on datacranch doesn't support sending audio files
 # let's use openapi server for providing URL to them
 AUDIO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../mp3_files"))
+audio_store = AudioStore(AUDIO_DIR)
+audio_stats = {"requests": 0, "bytes_served": 0, "not_modified": 0, "partial": 0}
 
 @app.route("/all_audio")
 async def show_all_audio():
-    files = [f for f in os.listdir(AUDIO_DIR) if f.endswith(".mp3")]
-    links = [f"<a href='/{f}'>{f}</a><br>" for f in files]
+    links = [f"<a href='/audio/{f}'>{f}</a><br>" for f in audio_store.names()]
     return "<h2>MP3 Files:</h2>" + "\n".join(links)
 
-@app.route("/<filename>")
-async def provide_mp3(filename):
-    return await send_from_directory(AUDIO_DIR, filename)
+@app.route("/audio", methods=["POST", "PUT"])
+async def upload_audio():
+    data = await request.get_data()
+    if not data:
+        return jsonify({"error": "Empty body, audio bytes required"}), 400
+
+    name = audio_store.put(data)
+    return jsonify({"name": name, "path": f"audio/{name}"}), 200
+
+@app.route("/audio/<name>")
+async def provide_mp3(name):
+    entry = audio_store.get(name)
+    if entry is None:
+        return jsonify({"error": "No such audio"}), 404
+    path, size, mtime = entry
+    audio_stats["requests"] += 1
+
+    # names are content hashes, so a cached copy never goes stale
+    headers = {
+        "ETag": f'"{name}"',
+        "Last-Modified": http_date(mtime),
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if request.if_none_match.contains_weak(name) or (
+        not request.if_none_match
+        and request.if_modified_since is not None
+        and request.if_modified_since.timestamp() >= int(mtime)
+    ):
+        audio_stats["not_modified"] += 1
+        return Response(b"", status=304, headers=headers)
+
+    start, stop, status = 0, size, 200
+    # multi-range requests are answered with the whole file
+    if request.range is not None and len(request.range.ranges) == 1:
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(b"", status=416, headers=headers)
+        start, stop = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        audio_stats["partial"] += 1
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        body = f.read(stop - start)
+    audio_stats["bytes_served"] += len(body)
+    return Response(body, status=status, headers=headers, mimetype="audio/mpeg")
+
+@app.route("/audio_stats", methods=["GET"])
+async def get_audio_stats():
+    return jsonify(
+        {**audio_stats, "files": len(audio_store.index), "stored_bytes": audio_store.total_bytes}
+    )
 
 # we need to connect main applicatiom with telegram bot
 # let's provide last message from telegram bot 
 last_message = None
+MESSAGE_TYPES = ("task", "cancel")
 
 @app.route("/get_last_msg", methods=["GET"])
 async def get_last_msg():
@@ -35,14 +92,43 @@ async def push_msg():
     if not isinstance(data, dict) or "text" not in data or "id" not in data:
         return jsonify({"error": "Invalid JSON, 'text' and 'id' required"}), 400
 
+    # "task" messages supersede the running task, "cancel" messages just stop it
+    msg_type = data.get("type", "task")
+    if msg_type not in MESSAGE_TYPES:
+        return jsonify({"error": f"Invalid 'type', expected one of {MESSAGE_TYPES}"}), 400
+
     last_message = {
         "text": data["text"],
-        "id": data["id"]
+        "id": data["id"],
+        "type": msg_type
     }
 
     return jsonify({"status": "ok"}), 200
 
+# the agent reports finished requests here and the telegram bot collects them
+finished_results = {}
+
+@app.route("/push_result", methods=["POST", "PUT"])
+async def push_result():
+    data = await request.get_json()
+
+    if not isinstance(data, dict) or "text" not in data or "id" not in data:
+        return jsonify({"error": "Invalid JSON, 'text' and 'id' required"}), 400
+
+    finished_results[data["id"]] = {
+        "id": data["id"],
+        "text": data["text"],
+        "images": data.get("images", [])
+    }
+
+    return jsonify({"status": "ok"}), 200
+
+@app.route("/pop_results", methods=["GET"])
+async def pop_results():
+    results = list(finished_results.values())
+    finished_results.clear()
+    return jsonify(results)
+
 
 if __name__ == "__main__":
-    os.makedirs(AUDIO_DIR, exist_ok=True)
     app.run(host="0.0.0.0", port=8000)
@@ -1,11 +1,14 @@
 import os
+import base64
+import asyncio
 import logging
 import requests
 import uuid
+import tempfile
 
 from dotenv import load_dotenv
 
-from telegram import Update
+from telegram import Update, InputMediaPhoto
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
@@ -17,30 +20,48 @@ from telegram.ext import (
 from pydub import AudioSegment
 
 FORMAT="mp3"
-VOICE_DIR="mp3_files"
 SERVER_IP="http://65.109.75.37:8000/"
 PUSH_PATH="push_msg"
+AUDIO_PATH="audio"
+RESULTS_PATH="pop_results"
+RESULTS_POLL_S=2
+# telegram accepts at most 10 photos in one media group
+MAX_PHOTOS=10
+# telegram rejects longer text messages, counted in UTF-16 code units
+MAX_MESSAGE_UNITS=4096
 
 TELEGRAM_BOT_TOKEN="<your-telegram-api-key>"
 TOKEN = "<your-datacrunch-interfer-api-key>"
 
-def make_all_work_for_me(text):
-    logging.info(f"Start work on next request: {text}")
+# request id -> chat the request came from, so its result can be sent back
+pending_chats = {}
+
+def make_all_work_for_me(text, msg_type="task"):
+    logging.info(f"Start work on next {msg_type} request: {text}")
 
     url = SERVER_IP + PUSH_PATH
     unique_id = str(uuid.uuid4())
 
     data = {
     "text": text,
-    "id": unique_id
+    "id": unique_id,
+    "type": msg_type
     }
 
     response_post = requests.post(url, json=data)
+    return unique_id
 
 def convert_voice_message(voice_msg, converted_voice_msg):
     audio = AudioSegment.from_file(voice_msg, format="ogg")
     audio.export(converted_voice_msg, format=FORMAT)
 
+def upload_audio(audio_file):
+    """Put the audio into the server's store, returns its path on the server"""
+    with open(audio_file, "rb") as f:
+        response = requests.post(SERVER_IP + AUDIO_PATH, data=f.read())
+    response.raise_for_status()
+    return response.json()["path"]
+
 def transcript(audio_path):
     audio_url = SERVER_IP + audio_path
 
@@ -66,14 +87,24 @@ def transcript(audio_path):
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text("Ask your question")
 
+async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    try:
+        make_all_work_for_me("", msg_type="cancel")
+        await update.message.reply_text("Current request is cancelled.")
+
+    except Exception as e:
+        logging.error(f"Issue during cancelling: {e}")
+        await update.message.reply_text("Something wrong happened.")
+
 async def process_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     text = update.message.text
-    if not text:
+    if not text or not text.strip():
         await update.message.reply_text("No text found.")
         return
 
     try:
-        make_all_work_for_me(text)
+        request_id = make_all_work_for_me(text)
+        pending_chats[request_id] = update.effective_chat.id
         await update.message.reply_text("Your request is ongoing.")
 
     except Exception as e:
@@ -82,6 +113,12 @@ async def process_text(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
 
 async def process_voice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # the server's audio store only gets files through upload_audio, the
+    # local copies live in a temporary directory removed on exit
+    with tempfile.TemporaryDirectory() as voice_dir:
+        await process_voice_in_dir(update, context, voice_dir)
+
+async def process_voice_in_dir(update: Update, context: ContextTypes.DEFAULT_TYPE, voice_dir: str) -> None:
     try:
         voice = update.message.voice
         if not voice:
@@ -92,19 +129,23 @@ async def process_voice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         voice_file = await context.bot.get_file(file_id)
         
         logging.debug(f"Downloading customer request: {voice_file}")
-        voice_msg_path_path = f"{VOICE_DIR}/voice_{file_id}.ogg"
+        voice_msg_path_path = os.path.join(voice_dir, f"voice_{file_id}.ogg")
         await voice_file.download_to_drive(custom_path=voice_msg_path_path)
 
         logging.debug(f"Convert customer request to appropriate format")
-        converted_msg_path = f"{VOICE_DIR}/voice_{file_id}.{FORMAT}"
+        converted_msg_path = os.path.join(voice_dir, f"voice_{file_id}.{FORMAT}")
         convert_voice_message(voice_msg_path_path, converted_msg_path)
 
-        logging.debug(f"Transcript customer request")
-        text = transcript(f"voice_{file_id}.{FORMAT}")
+        logging.debug(f"Upload customer request to the audio store")
+        audio_path = upload_audio(converted_msg_path)
 
-        make_all_work_for_me(text)
+        logging.debug(f"Transcript customer request")
+        text = transcript(audio_path)
 
+        # the agent skips empty requests, so no result would ever come back
         if text:
+            request_id = make_all_work_for_me(text)
+            pending_chats[request_id] = update.effective_chat.id
             await update.message.reply_text("Your request is ongoing.")
         else:
             await update.message.reply_text("Request is empty")
@@ -112,13 +153,58 @@ async def process_voice(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     except Exception as e:
         logging.error(f"Issue during transcribing: {e}")
         await update.message.reply_text("Something wrong happened")
-    finally:
-        if os.path.exists(voice_msg_path_path):
-            os.remove(voice_msg_path_path)
-        if os.path.exists(converted_msg_path):
-            os.remove(converted_msg_path)
 
 
+def split_message(text):
+    chunks, start, units = [], 0, 0
+    for i, char in enumerate(text):
+        # characters outside the BMP take two UTF-16 code units
+        char_units = 2 if ord(char) > 0xFFFF else 1
+        if units + char_units > MAX_MESSAGE_UNITS:
+            chunks.append(text[start:i])
+            start, units = i, 0
+        units += char_units
+    chunks.append(text[start:])
+    return chunks
+
+async def send_result(bot, chat_id, result) -> None:
+    text = result["text"] or "Your request is done."
+    try:
+        for chunk in split_message(text):
+            await bot.send_message(chat_id, chunk)
+    except Exception as e:
+        # the figures are still worth sending
+        logging.error(f"Issue during sending result text of {result['id']}: {e}")
+
+    photos = [base64.b64decode(image) for image in result.get("images", [])[:MAX_PHOTOS]]
+    if len(photos) == 1:
+        await bot.send_photo(chat_id, photos[0])
+    elif photos:
+        await bot.send_media_group(chat_id, [InputMediaPhoto(photo) for photo in photos])
+
+async def deliver_results(app) -> None:
+    while True:
+        await asyncio.sleep(RESULTS_POLL_S)
+        try:
+            response = await asyncio.to_thread(requests.get, SERVER_IP + RESULTS_PATH)
+            response.raise_for_status()
+            results = response.json()
+        except requests.RequestException as e:
+            logging.error(f"Issue during fetching results: {e}")
+            continue
+
+        for result in results:
+            chat_id = pending_chats.pop(result["id"], None)
+            if chat_id is None:
+                continue
+            try:
+                await send_result(app.bot, chat_id, result)
+            except Exception as e:
+                logging.error(f"Issue during sending result of {result['id']}: {e}")
+
+async def start_result_delivery(app) -> None:
+    app.create_task(deliver_results(app))
+
 def tg() -> None:
     logging.basicConfig(
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
@@ -133,9 +219,15 @@ def tg() -> None:
         print("Error:TELEGRAM_BOT_TOKEN is missing.")
         return
 
-    app = ApplicationBuilder().token(TELEGRAM_BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(start_result_delivery)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", start))
+    app.add_handler(CommandHandler("cancel", cancel))
     app.add_handler(MessageHandler(filters.VOICE, process_voice))
     app.add_handler(MessageHandler(filters.TEXT, process_text))
 
@@ -1,16 +1,42 @@
 import json
+import base64
 import requests
 
+SERVER_URL = "http://65.109.75.37:8000"
+
+# a "task" message supersedes the running task, a "cancel" message only stops it
+REQUEST_TYPE_TASK = "task"
+REQUEST_TYPE_CANCEL = "cancel"
+
 
 def get_latest_user_request():
-    url = "http://65.109.75.37:8000/get_last_msg"
+    """Latest message of the relay server, None if there is none or it can't be reached"""
+    url = f"{SERVER_URL}/get_last_msg"
     try:
         response = requests.get(url)
         response.raise_for_status()  # Raise an exception for bad status codes
         json_data = response.json()
+        json_data.setdefault("type", REQUEST_TYPE_TASK)
         return json_data
     except requests.RequestException as e:
-        return {"id": "-1", "text": ""}
+        return None
+
+
+def push_task_result(request_id, text, images=()):
+    """Send the outcome of a request back to the telegram bot, images are png bytes"""
+    url = f"{SERVER_URL}/push_result"
+    data = {
+        "id": request_id,
+        "text": text,
+        "images": [base64.b64encode(image).decode("ascii") for image in images],
+    }
+    try:
+        response = requests.post(url, json=data)
+        response.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        print(f"Failed to push the result of request {request_id}: {e}")
+        return False
 
 
 if __name__ == "__main__":